@@ -0,0 +1,104 @@
+"""Import-time check for app start and report worker spawn.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for each
+module, prints the slowest imports and fails when a module goes over its budget
+or pulls in a heavy dependency that should only load on first use.
+
+    python check_import_time.py
+    python check_import_time.py --top 20 --budget streamlit_ELI=2.5
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Cumulative import budget in seconds per module
+BUDGETS = {
+    "streamlit_data": 3.0,
+    "streamlit_ELI": 3.0,
+    "report_export": 0.3,  # imported by every spawned render worker
+}
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ["yfinance", "yahoofinancials", "plotly", "kaleido", "bs4", "PIL"]
+# streamlit itself pulls in some of them (plotly theme, PIL); the apps cannot avoid those
+FRAMEWORK = "streamlit"
+
+
+def profile_import(module):
+    """Return [(cumulative_us, self_us, name, depth)] for every import of module"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((int(cumulative_us), int(self_us), name.strip(), depth))
+    return imports
+
+
+def top_level_modules(imports):
+    return {name.split(".")[0] for _, _, name, _ in imports}
+
+
+def check_module(module, budget, top, framework_modules):
+    imports = profile_import(module)
+    total = sum(cumulative for cumulative, _, _, depth in imports if depth == 0) / 1e6
+    print(f"{module}: {total:.3f}s (budget {budget:.3f}s)")
+    for cumulative, self_us, name, _ in sorted(imports, reverse=True)[:top]:
+        print(f"    {cumulative / 1e6:8.3f}s  {self_us / 1e6:8.3f}s  {name}")
+
+    errors = []
+    if total > budget:
+        errors.append(f"{module} took {total:.3f}s to import, budget is {budget:.3f}s")
+    loaded = top_level_modules(imports)
+    if FRAMEWORK in loaded:
+        loaded -= framework_modules
+    for lazy in LAZY_MODULES:
+        if lazy in loaded:
+            errors.append(f"{module} imports {lazy} at module level")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS), help="modules to check")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to show")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=SECONDS",
+                        help="override the budget of a module")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS)
+    for override in args.budget:
+        module, seconds = override.split("=")
+        budgets[module] = float(seconds)
+
+    errors = []
+    try:
+        framework_modules = top_level_modules(profile_import(FRAMEWORK))
+    except RuntimeError:
+        framework_modules = set()
+    for module in args.modules:
+        try:
+            errors.extend(check_module(module, budgets.get(module, 1.0), args.top, framework_modules))
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    for error in errors:
+        print(f"FAIL: {error}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import exports
+import http_guard
+
+PRICES_TTL = 3600  # seconds a ticker's price history is reused
+# Timezone of the scraped Date and Time columns (investing.com's display timezone)
+RELEASE_TZ = "America/New_York"
+# Exchange timezone -> local time of the closing price, used to timestamp daily closes
+CLOSE_TIMES = {
+    "Asia/Hong_Kong": "16:10",
+    "Asia/Shanghai": "15:00",
+    "Asia/Tokyo": "15:30",
+    "Europe/London": "16:30",
+}
+DEFAULT_CLOSE_TIME = "16:00"
+# Window name -> (first, last) trading day relative to the release, day 0 being
+# each ticker's first session whose close comes after the release
+WINDOWS = {
+    "Day 0": (0, 0),
+    "Day -1 to +1": (-1, 1),
+    "Day 0 to +5": (0, 5),
+    "Day 0 to +20": (0, 20),
+}
+
+_lock = threading.Lock()
+_prices = {}  # (ticker, period) -> (fetched_at, close Series)
+
+
+def fetch_close(ticker, period="max"):
+    import yfinance as yf
+
+    history = http_guard.call("finance.yahoo.com", yf.Ticker(ticker).history, period=period,
+                              cache_key=("history", ticker, period))
+    close = history['Close'].dropna()
+    close.index = close_timestamps(close.index)
+    return close
+
+
+def close_timestamps(index):
+    """UTC time of each daily close, from the exchange timezone of yfinance's index"""
+    tz = str(index.tz) if index.tz is not None else "UTC"
+    close_time = pd.Timedelta(CLOSE_TIMES.get(tz, DEFAULT_CLOSE_TIME) + ":00")
+    local = index.tz_localize(None).normalize() + close_time
+    return local.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward").tz_convert("UTC")
+
+
+def get_close(ticker, period="max"):
+    key = (ticker, period)
+    with _lock:
+        cached = _prices.get(key)
+    if cached and time.monotonic() - cached[0] < PRICES_TTL:
+        return cached[1]
+    close = fetch_close(ticker, period)
+    with _lock:
+        _prices[key] = (time.monotonic(), close)
+    return close
+
+
+def get_return_matrix(tickers, period="max"):
+    """Daily log returns, one column per ticker on the union of UTC close timestamps"""
+    def fetch(ticker):
+        try:
+            return get_close(ticker, period)
+        except Exception as e:
+            logging.error(f"Error fetching prices for {ticker}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(8, len(tickers) or 1)) as executor:
+        closes = dict(zip(tickers, executor.map(fetch, tickers)))
+    closes = {ticker: close for ticker, close in closes.items() if close is not None and not close.empty}
+    if not closes:
+        return pd.DataFrame()
+    # Returns are taken per ticker before aligning, so holidays do not create gaps
+    returns = {ticker: np.log(close).diff().dropna() for ticker, close in closes.items()}
+    return pd.DataFrame(returns).sort_index()
+
+
+def release_timestamps(dates, times, tz=RELEASE_TZ):
+    """UTC release times from calendar dates and 'HH:MM' times in tz.
+
+    Rows without a clock time ('All Day', blank) are taken as released at
+    midnight, so day 0 is that date's session.
+    """
+    offsets = pd.to_timedelta(times.astype("string") + ":00", errors="coerce").fillna(pd.Timedelta(0))
+    local = dates + offsets
+    return local.dt.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward").dt.tz_convert("UTC")
+
+
+def release_events(raw_df, tz=RELEASE_TZ):
+    """One row per release with its surprise (Actual - Forecast) from scraped raw data"""
+    typed = exports.typed_raw_data(raw_df)
+    events = pd.DataFrame({
+        "Indicator": typed['Title'].str.split(' - ').str[0],
+        "Release Date": typed['Release Date'],
+        "Release Time": release_timestamps(typed['Release Date'], typed['Time'], tz),
+        "Actual": typed['Actual'],
+        "Forecast": typed['Forecast'],
+    })
+    events["Surprise"] = events["Actual"] - events["Forecast"]
+    events = events.dropna(subset=["Release Time", "Surprise"])
+    return events.drop_duplicates(["Indicator", "Release Date"]).sort_values("Release Time").reset_index(drop=True)
+
+
+def utc_datetime64(values):
+    """Timezone-aware timestamps as naive UTC datetime64[ns], for np.searchsorted"""
+    return pd.DatetimeIndex(values).tz_convert("UTC").tz_localize(None).values.astype("datetime64[ns]")
+
+
+def event_windows(returns, events, windows=WINDOWS):
+    """Return and volatility of every ticker around every event.
+
+    Day 0 is found per ticker with np.searchsorted of the release times on that
+    ticker's close timestamps, and window sums come from cumulative sums, so
+    there is no per-event loop.
+    """
+    release_times = utc_datetime64(events["Release Time"])
+    frames = []
+    for ticker in returns.columns:
+        series = returns[ticker].dropna()
+        closes = utc_datetime64(series.index)
+        values = series.to_numpy(dtype="float64")
+        cum_sum = np.concatenate([[0.0], np.cumsum(values)])
+        cum_sq = np.concatenate([[0.0], np.cumsum(values ** 2)])
+
+        # First close strictly after the release
+        positions = np.searchsorted(closes, release_times, side="right")
+        for name, (first, last) in windows.items():
+            start = positions + first
+            end = positions + last + 1
+            in_range = (start >= 0) & (end <= len(values))
+            start = np.clip(start, 0, len(values))
+            end = np.clip(end, 0, len(values))
+
+            total = cum_sum[end] - cum_sum[start]
+            squares = cum_sq[end] - cum_sq[start]
+            count = end - start
+            with np.errstate(invalid="ignore", divide="ignore"):
+                variance = (squares - total ** 2 / count) / (count - 1)
+                volatility = np.sqrt(np.where(count > 1, np.maximum(variance, 0), np.nan))
+
+            frames.append(pd.DataFrame({
+                "Indicator": events["Indicator"].values,
+                "Release Date": events["Release Date"].values,
+                "Surprise": events["Surprise"].values,
+                "Ticker": ticker,
+                "Window": name,
+                "Return": np.where(in_range & (count > 0), np.expm1(total), np.nan),
+                "Volatility": np.where(in_range, volatility, np.nan),
+            }))
+    return pd.concat(frames, ignore_index=True).dropna(subset=["Return"])
+
+
+def summarize(reactions):
+    """Per indicator, ticker and window: how returns line up with surprises"""
+    reactions = reactions.assign(
+        Direction=np.sign(reactions["Surprise"]),
+        SurpriseReturn=reactions["Surprise"] * reactions["Return"],
+        SurpriseSq=reactions["Surprise"] ** 2,
+        ReturnSq=reactions["Return"] ** 2,
+    )
+    grouped = reactions.groupby(["Indicator", "Ticker", "Window"], sort=False)
+    stats = grouped.agg(
+        Events=("Return", "size"),
+        MeanReturn=("Return", "mean"),
+        MeanVolatility=("Volatility", "mean"),
+        MeanSurprise=("Surprise", "mean"),
+        MeanSurpriseReturn=("SurpriseReturn", "mean"),
+        MeanSurpriseSq=("SurpriseSq", "mean"),
+        MeanReturnSq=("ReturnSq", "mean"),
+    )
+    covariance = stats["MeanSurpriseReturn"] - stats["MeanSurprise"] * stats["MeanReturn"]
+    surprise_var = stats["MeanSurpriseSq"] - stats["MeanSurprise"] ** 2
+    return_var = stats["MeanReturnSq"] - stats["MeanReturn"] ** 2
+    stats["Beta to Surprise"] = covariance / surprise_var.where(surprise_var > 0)
+    stats["Correlation"] = covariance / np.sqrt((surprise_var * return_var).where((surprise_var > 0) & (return_var > 0)))
+    split = reactions.groupby(["Indicator", "Ticker", "Window", "Direction"], sort=False)["Return"].mean().unstack()
+    stats["Return on Positive Surprise"] = split.get(1.0)
+    stats["Return on Negative Surprise"] = split.get(-1.0)
+    stats = stats.rename(columns={"MeanReturn": "Mean Return", "MeanVolatility": "Mean Volatility"})
+    return stats.drop(columns=["MeanSurprise", "MeanSurpriseReturn", "MeanSurpriseSq", "MeanReturnSq"]).reset_index()
+
+
+def run_event_study(raw_df, tickers, indicators=None, period="max", windows=WINDOWS):
+    events = release_events(raw_df)
+    if indicators:
+        events = events[events["Indicator"].isin(indicators)]
+    returns = get_return_matrix(tickers, period)
+    if events.empty or returns.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    reactions = event_windows(returns, events.reset_index(drop=True), windows)
+    return reactions, summarize(reactions)
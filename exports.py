@@ -0,0 +1,113 @@
+import gzip
+import io
+
+import pandas as pd
+
+# Format -> (file extension, mime type)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": ("arrow", "application/vnd.apache.arrow.file"),
+}
+CHUNK_ROWS = 50_000
+
+DATE_PATTERN = r'(\w+ \d{2}, \d{4})(?: \((\w+)\))?'
+VALUE_COLUMNS = ["Forecast", "This Month", "1 Month Ago", "2 Months Ago", "3 Months Ago", "4 Months Ago"]
+
+
+def to_number(value):
+    """Parse investing.com values like '3.5%', '-12.1K', '2.1B' or '1,234.5' into floats"""
+    if not isinstance(value, str):
+        return float(value) if isinstance(value, (int, float)) else None
+    value = value.strip().rstrip('%').replace(',', '')
+    multiplier = {'B': 1e9, 'M': 1e6, 'K': 1e3}.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    try:
+        return float(value) * multiplier
+    except ValueError:
+        return None
+
+
+def split_release_date(dates):
+    """Split 'Jan 05, 2024 (Dec)' into a datetime column and a reference period column"""
+    parts = dates.astype(str).str.extract(DATE_PATTERN)
+    return pd.to_datetime(parts[0], format="%b %d, %Y", errors="coerce"), parts[1].astype("string")
+
+
+def numeric(values):
+    return values.map(to_number).astype("float64")
+
+
+def typed_raw_data(df):
+    release_date, reference_period = split_release_date(df['Date'])
+    return pd.DataFrame({
+        "Title": df['Title'].astype("string"),
+        "Release Date": release_date,
+        "Reference Period": reference_period,
+        "Time": df['Time'].astype("string"),
+        "Actual": numeric(df['Actual']),
+        "Forecast": numeric(df['Forecast']),
+        "Previous": numeric(df['Previous']),
+        "Importance": df['Importance'].astype("string"),
+    })
+
+
+def typed_processed_data(df):
+    release_date, reference_period = split_release_date(df['Data Update'])
+    typed = pd.DataFrame({
+        "Indicator": df['Indicator'].astype("string"),
+        "Release Date": release_date,
+        "Reference Period": reference_period,
+        "Vs Forecast": df['Vs Forecast'].mask(df['Vs Forecast'] == '').astype("string"),
+    })
+    for column in VALUE_COLUMNS:
+        typed[column] = numeric(df[column])
+    return typed
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    if df.empty:
+        yield df
+        return
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_export(df, fmt, fileobj, chunk_rows=CHUNK_ROWS):
+    """Write df to a binary file object in chunks of chunk_rows rows"""
+    if fmt in ("CSV", "CSV (gzip)"):
+        out = gzip.GzipFile(fileobj=fileobj, mode="wb") if fmt == "CSV (gzip)" else fileobj
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+        for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+            chunk.to_csv(text, index=False, header=i == 0)
+        text.flush()
+        text.detach()
+        if out is not fileobj:
+            out.close()
+        return
+
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    if fmt == "Parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(fileobj, schema, compression="zstd")
+    elif fmt == "Arrow IPC":
+        import pyarrow.ipc
+        writer = pa.ipc.new_file(fileobj, schema)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    with writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def export_file(df, fmt, chunk_rows=CHUNK_ROWS):
+    """Export df into a rewound in-memory file, written chunk by chunk"""
+    fileobj = io.BytesIO()
+    write_export(df, fmt, fileobj, chunk_rows)
+    fileobj.seek(0)
+    return fileobj
@@ -0,0 +1,287 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+REQUEST_TIMEOUT = 15
+MAX_WAIT = 20  # longest a caller queues for a token before giving up
+MAX_CACHED_RESPONSES = 200  # last good responses and call results kept for fallback
+
+# Host suffix -> (requests per second, burst). Shared by every session of the server process.
+RATE_LIMITS = {
+    "investing.com": (2.0, 5),
+    "yahoo.com": (5.0, 10),
+}
+DEFAULT_RATE_LIMIT = (2.0, 5)
+
+FAILURE_THRESHOLD = 5  # consecutive failures before a host's circuit opens
+RESET_TIMEOUT = 60  # seconds before a single trial request is let through
+
+# Exception classes (matched by name anywhere in the MRO) that mean the host is down
+# or throttling. Matching names covers requests, curl_cffi (yfinance's client) and the
+# builtins without importing them here.
+HOST_FAILURE_ERRORS = {"ConnectionError", "Timeout", "TimeoutError", "YFRateLimitError"}
+
+
+class HostUnavailableError(Exception):
+    """The host is rate limited or its circuit is open; nothing was sent"""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        # Honour Retry-After: no tokens are handed out until the pause ends
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def _reserve(self):
+        """Take a token and return how long to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, self.paused_until - now)
+
+    def _release(self):
+        with self.lock:
+            self.tokens += 1
+
+    def acquire(self, max_wait=MAX_WAIT):
+        wait = self._reserve()
+        if wait > max_wait:
+            self._release()
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_until = 0
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.failures < self.failure_threshold:
+            return "closed"
+        return "open" if time.monotonic() < self.opened_until else "half-open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def cancel(self):
+        # The allowed request was never sent
+        with self.lock:
+            self.trial_running = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial_running = False
+
+    def record_failure(self, open_for=None):
+        """Count a failure; open_for (from Retry-After) opens the circuit for exactly that long"""
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if open_for is not None:
+                self.failures = max(self.failures, self.failure_threshold)
+                self.opened_until = time.monotonic() + open_for
+            elif self.failures >= self.failure_threshold:
+                self.opened_until = time.monotonic() + self.reset_timeout
+
+
+_lock = threading.Lock()
+_buckets = {}
+_breakers = {}
+_last_good = OrderedDict()  # url or call cache key -> last successful response or result
+
+
+def host_key(url_or_host):
+    host = urlsplit(url_or_host).netloc or url_or_host
+    host = host.split(":")[0].lower()
+    for suffix in RATE_LIMITS:
+        if host == suffix or host.endswith("." + suffix):
+            return suffix
+    return host
+
+
+def get_bucket(host):
+    with _lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT))
+        return _buckets[host]
+
+
+def get_breaker(host):
+    with _lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def host_status():
+    """{host: circuit state} for every host seen so far"""
+    with _lock:
+        breakers = dict(_breakers)
+    return {host: breaker.state for host, breaker in breakers.items()}
+
+
+def reset():
+    """Forget all rate limit, circuit and cached response state"""
+    with _lock:
+        _buckets.clear()
+        _breakers.clear()
+        _last_good.clear()
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_throttled(host, status_code):
+    """429, or 403 from a host we rate limit (investing.com blocks bursts with 403)"""
+    return status_code == 429 or (status_code == 403 and host_key(host) in RATE_LIMITS)
+
+
+def is_host_failure(host, error):
+    """True when error says the host is down or throttling rather than the request being bad"""
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code >= 500 or is_throttled(host, status_code)
+    return any(cls.__name__ in HOST_FAILURE_ERRORS for cls in type(error).__mro__)
+
+
+def call(host, fn, *args, cache_key=None, **kwargs):
+    """Run fn under the host's rate limit and circuit breaker.
+
+    Only host failures (see is_host_failure) count towards opening the circuit;
+    other errors, like an unknown ticker, are raised without touching it. An
+    error with a `retry_after` attribute (seconds) pauses the host and opens its
+    circuit for that long.
+
+    With a cache_key the last good result is kept and returned (as a copy) while
+    the host is unavailable or failing; without one the error is raised.
+    """
+    host = host_key(host)
+    try:
+        result = _call(host, fn, args, kwargs)
+    except Exception as e:
+        if cache_key is None or not (isinstance(e, HostUnavailableError) or is_host_failure(host, e)):
+            raise
+        return copy.copy(_last_good_for(cache_key, e))
+    if cache_key is not None:
+        _remember(cache_key, result)
+    return result
+
+
+def _call(host, fn, args, kwargs):
+    breaker = get_breaker(host)
+    if not breaker.allow():
+        raise HostUnavailableError(f"Circuit open for {host}")
+    if not get_bucket(host).acquire():
+        breaker.cancel()
+        raise HostUnavailableError(f"Rate limit queue full for {host}")
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        if not is_host_failure(host, e):
+            breaker.cancel()
+            raise
+        retry_after = getattr(e, "retry_after", None)
+        if retry_after is not None:
+            get_bucket(host).pause(retry_after)
+        breaker.record_failure(open_for=retry_after)
+        raise
+    breaker.record_success()
+    return result
+
+
+def _remember(key, value):
+    with _lock:
+        _last_good[key] = value
+        _last_good.move_to_end(key)
+        while len(_last_good) > MAX_CACHED_RESPONSES:
+            _last_good.popitem(last=False)
+
+
+def _last_good_for(key, error):
+    with _lock:
+        value = _last_good.get(key)
+    if value is None:
+        raise error
+    logging.warning(f"Serving last good response for {key}: {str(error)}")
+    return value
+
+
+def get(url, timeout=REQUEST_TIMEOUT, **kwargs):
+    """requests.get behind the host's rate limit and circuit breaker.
+
+    Throttling responses (429, 403 from a rate limited host) and 5xx count as
+    host failures; Retry-After pauses the host and opens its circuit. While a
+    host is unavailable the last good response for the URL is returned with
+    `from_cache = True`; without one the error is raised.
+    """
+    import requests
+
+    host = host_key(url)
+
+    def fetch():
+        response = requests.get(url, timeout=timeout, **kwargs)
+        if is_throttled(host, response.status_code) or response.status_code >= 500:
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                # call() pauses the host and records the failure once
+                e.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                raise
+        return response
+
+    try:
+        response = call(host, fetch)
+    except (HostUnavailableError, requests.RequestException) as e:
+        response = copy.copy(_last_good_for(url, e))
+        response.from_cache = True
+        return response
+
+    response.from_cache = False
+    if response.ok:
+        _remember(url, response)
+    return response
@@ -0,0 +1,425 @@
+"""Offline load test for the dashboards.
+
+Starts local stub servers for investing.com indicator pages and Yahoo chart and
+quote JSON, then runs many concurrent simulated sessions through the real
+scrape_data, process_data, create_chart, get_stock_data, plot_stock_chart and
+get_financial_metrics code. Reports throughput, p50/p99 latency and memory per
+session.
+
+Both stubs run under the production http_guard rate limits, so results include
+the queueing real users see; --upstream-rate overrides them (0 disables).
+
+Recorded responses in the recordings directory are replayed; anything missing
+is generated. Record real responses once with --record (needs network).
+
+    python loadtest.py --sessions 100 --concurrency 20 --latency 200 --error-rate 0.02
+    python loadtest.py --record
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import types
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import http_guard
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "loadtest_recordings")
+DEFAULT_TICKERS = ["AAPL", "0700.HK", "9988.HK", "0005.HK"]
+YAHOO_URL = "https://query2.finance.yahoo.com"
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+
+def import_apps():
+    # Both apps call st.set_page_config at import, which is harmless in bare mode
+    import streamlit_data
+    import streamlit_ELI
+    return streamlit_data, streamlit_ELI
+
+
+def slug(url):
+    return urlsplit(url).path.rstrip('/').split('/')[-1]
+
+
+def synthetic_page(indicator):
+    today = datetime.now()
+    rows = []
+    for i in range(8):
+        release = (today.replace(day=5) - timedelta(days=30 * i)).replace(day=5)
+        period = (release - timedelta(days=30)).strftime("%b")
+        actual, forecast, previous = (f"{random.uniform(-1, 5):.1f}%" for _ in range(3))
+        rows.append(f"<tr><td>{release:%b %d, %Y} ({period})</td><td>08:30</td><td>{actual}</td>"
+                    f"<td>{forecast}</td><td>{previous}</td><td></td></tr>")
+    return (f"<html><head><title>{indicator} - Investing.com</title></head><body><table>"
+            f"<tr><th>Release Date</th></tr>{''.join(rows)}</table></body></html>").encode("utf-8")
+
+
+def synthetic_chart(ticker, days=260):
+    rng = np.random.default_rng(abs(hash(ticker)) % 2**32)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    dates = pd.bdate_range(end=datetime.now().date(), periods=days)
+    quote = {
+        "open": (close * rng.uniform(0.99, 1.01, days)).round(2).tolist(),
+        "high": (close * 1.02).round(2).tolist(),
+        "low": (close * 0.98).round(2).tolist(),
+        "close": close.round(2).tolist(),
+        "volume": rng.integers(1e5, 1e7, days).tolist(),
+    }
+    chart = {"meta": {"symbol": ticker, "exchangeTimezoneName": "UTC"},
+             "timestamp": [int(d.timestamp()) for d in dates],
+             "indicators": {"quote": [quote]}}
+    return json.dumps({"chart": {"result": [chart], "error": None}}).encode("utf-8")
+
+
+def synthetic_quote(ticker):
+    rng = random.Random(ticker)
+    quote = {
+        "symbol": ticker,
+        "marketCap": rng.uniform(1e10, 3e12),
+        "trailingPE": rng.uniform(5, 40),
+        "forwardPE": rng.uniform(5, 35),
+        "pegRatio": rng.uniform(0.5, 3),
+        "trailingAnnualDividendYield": rng.uniform(0, 0.06),
+        "priceToBook": rng.uniform(0.5, 10),
+        "netIncomeToCommon": rng.uniform(1e8, 1e11),
+        "totalRevenue": rng.uniform(1e9, 4e11),
+        "profitMargins": rng.uniform(0, 0.4),
+        "returnOnEquity": rng.uniform(0, 0.5),
+    }
+    return json.dumps({"quoteResponse": {"result": [quote], "error": None}}).encode("utf-8")
+
+
+def load_fixtures(directory, urls, indicators, tickers):
+    """{route: body} for every stub route, recorded if available, else generated"""
+    def recorded(*parts):
+        path = os.path.join(directory, *parts)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return None
+
+    fixtures = {}
+    for url, indicator in zip(urls, indicators):
+        fixtures[f"/economic-calendar/{slug(url)}"] = recorded("investing", f"{slug(url)}.html") or synthetic_page(indicator)
+    for ticker in tickers:
+        fixtures[f"/v8/finance/chart/{ticker}"] = recorded("yahoo", f"chart_{ticker}.json") or synthetic_chart(ticker)
+        fixtures[f"/v7/finance/quote/{ticker}"] = recorded("yahoo", f"quote_{ticker}.json") or synthetic_quote(ticker)
+    return fixtures
+
+
+def record(directory, urls, tickers):
+    """Save real investing.com pages and Yahoo JSON for later replay"""
+    import requests
+
+    targets = [(url, ("investing", f"{slug(url)}.html")) for url in urls]
+    for ticker in tickers:
+        targets.append((f"{YAHOO_URL}/v8/finance/chart/{ticker}?range=1y&interval=1d", ("yahoo", f"chart_{ticker}.json")))
+        targets.append((f"{YAHOO_URL}/v7/finance/quote?symbols={ticker}", ("yahoo", f"quote_{ticker}.json")))
+
+    for url, parts in targets:
+        try:
+            response = requests.get(url, headers=HEADERS, timeout=http_guard.REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except Exception as e:
+            logging.warning(f"Not recorded {url}: {str(e)}")
+            continue
+        path = os.path.join(directory, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(response.content)
+        print(f"Recorded {url} -> {path}")
+        time.sleep(1)  # be polite to the real sites
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, fixtures, latency, error_rate, error_status):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self.counter_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        route = parts.path
+        if route == "/v7/finance/quote":
+            route = f"{route}/{parse_qs(parts.query).get('symbols', [''])[0]}"
+
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+        failed = random.random() < server.error_rate
+        with server.counter_lock:
+            server.requests += 1
+            server.errors += failed
+
+        body = server.fixtures.get(route)
+        if failed or body is None:
+            self.send_response(server.error_status if failed else 404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json" if route.startswith("/v") else "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTicker:
+    """yfinance.Ticker stand-in that reads chart and quote JSON from the Yahoo stub.
+
+    yfinance always talks to the real Yahoo hosts, so only its transport is
+    replaced; the app code calling it runs unchanged.
+    """
+    base_url = None
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+
+    def _get(self, path):
+        import requests
+
+        response = requests.get(f"{self.base_url}{path}", timeout=http_guard.REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def history(self, period="1mo"):
+        chart = self._get(f"/v8/finance/chart/{self.ticker}?range={period}&interval=1d")["chart"]["result"][0]
+        quote = chart["indicators"]["quote"][0]
+        index = pd.to_datetime(chart["timestamp"], unit="s", utc=True).tz_convert(chart["meta"]["exchangeTimezoneName"])
+        return pd.DataFrame({
+            "Open": quote["open"],
+            "High": quote["high"],
+            "Low": quote["low"],
+            "Close": quote["close"],
+            "Volume": quote["volume"],
+        }, index=index.normalize().rename("Date"), dtype="float64")
+
+    @property
+    def info(self):
+        return self._get(f"/v7/finance/quote?symbols={self.ticker}")["quoteResponse"]["result"][0]
+
+    recommendations = None
+
+
+def run_session(apps, urls, country, ticker):
+    """One dashboard visit: scrape, analyze and chart a country, then load a ticker"""
+    streamlit_data, streamlit_ELI = apps
+    timings = {}
+    start = time.perf_counter()
+
+    df = streamlit_data.scrape_data(urls)
+    timings["scrape"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    processed_data, indicators = streamlit_data.process_data(df, country)
+    timings["process"] = time.perf_counter() - mark
+
+    # Streamlit serializes every figure to JSON before sending it to the browser
+    mark = time.perf_counter()
+    for indicator, data in indicators.items():
+        data = [d for d in data if d.get('Actual')]
+        if data:
+            streamlit_data.create_chart(data, indicator).to_json()
+    timings["charts"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    data = streamlit_ELI.get_stock_data(ticker)
+    levels = streamlit_ELI.calculate_price_levels(data['Close'].iloc[-1], 90, 80, 105)
+    streamlit_ELI.plot_stock_chart(data, ticker, *levels).to_json()
+    streamlit_ELI.get_financial_metrics(ticker)
+    timings["stock"] = time.perf_counter() - mark
+
+    timings["total"] = time.perf_counter() - start
+    timings["rows"] = len(df)
+    timings["indicators"] = len(processed_data)
+    return timings
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_load(args):
+    apps = import_apps()
+    streamlit_data = apps[0]
+    logging.getLogger().setLevel(args.log_level)
+    # Library deprecation warnings would be printed once per session
+    warnings.filterwarnings("ignore", category=FutureWarning)
+
+    urls = streamlit_data.get_urls(args.country)
+    indicators = list(streamlit_data.get_indicators(args.country))
+    fixtures = load_fixtures(args.recordings, urls, indicators, args.tickers)
+    investing = StubServer(fixtures, args.latency / 1000, args.error_rate, args.error_status).start()
+    yahoo = StubServer(fixtures, args.latency / 1000, args.error_rate, args.error_status).start()
+    stub_urls = [f"{investing.base_url}/economic-calendar/{slug(url)}" for url in urls]
+
+    saved_limits = dict(http_guard.RATE_LIMITS)
+    http_guard.reset()
+    # The investing.com stub is reached as 127.0.0.1; Yahoo calls already use the yahoo.com limit
+    http_guard.RATE_LIMITS["127.0.0.1"] = http_guard.RATE_LIMITS["investing.com"]
+    if args.upstream_rate is not None:
+        limit = (args.upstream_rate, max(1, int(args.upstream_rate))) if args.upstream_rate else (1e9, 1e9)
+        http_guard.RATE_LIMITS["127.0.0.1"] = http_guard.RATE_LIMITS["yahoo.com"] = limit
+    StubTicker.base_url = yahoo.base_url
+    real_yfinance = sys.modules.get("yfinance")
+    sys.modules["yfinance"] = types.SimpleNamespace(Ticker=StubTicker)
+
+    try:
+        # Warm up imports and caches, then measure one session on its own
+        run_session(apps, stub_urls, args.country, args.tickers[0])
+        tracemalloc.start()
+        run_session(apps, stub_urls, args.country, args.tickers[0])
+        session_peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+        investing.requests = investing.errors = yahoo.requests = yahoo.errors = 0
+        rss_before = max_rss_mb()
+        results, failures = [], []
+
+        def session(i):
+            try:
+                results.append(run_session(apps, stub_urls, args.country, args.tickers[i % len(args.tickers)]))
+            except Exception as e:
+                failures.append(f"{type(e).__name__}: {str(e)}")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(session, range(args.sessions)))
+        elapsed = time.perf_counter() - start
+        rss_growth = max_rss_mb() - rss_before
+        circuits = http_guard.host_status()
+    finally:
+        if real_yfinance is not None:
+            sys.modules["yfinance"] = real_yfinance
+        else:
+            sys.modules.pop("yfinance", None)
+        investing.shutdown()
+        yahoo.shutdown()
+        http_guard.RATE_LIMITS.clear()
+        http_guard.RATE_LIMITS.update(saved_limits)
+        http_guard.reset()
+
+    report = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "succeeded": len(results),
+        "failed": len(failures),
+        "elapsed_s": elapsed,
+        "throughput_sessions_per_s": len(results) / elapsed if elapsed else float("nan"),
+        "latency_s": {
+            phase: {"p50": percentile([r[phase] for r in results], 50),
+                    "p99": percentile([r[phase] for r in results], 99),
+                    "max": max((r[phase] for r in results), default=float("nan"))}
+            for phase in ["total", "scrape", "process", "charts", "stock"]
+        },
+        "mean_rows_per_session": sum(r["rows"] for r in results) / len(results) if results else 0,
+        "stub_requests": {"investing": investing.requests, "yahoo": yahoo.requests},
+        "stub_errors": {"investing": investing.errors, "yahoo": yahoo.errors},
+        "memory_mb": {
+            "peak_allocations_per_session": session_peak,
+            "rss_growth_under_load": rss_growth,
+            "rss_growth_per_concurrent_session": rss_growth / args.concurrency,
+        },
+        "circuits": circuits,
+        "failure_samples": failures[:5],
+    }
+    return report
+
+
+def print_report(report):
+    print(f"Sessions: {report['succeeded']} ok, {report['failed']} failed "
+          f"({report['sessions']} at concurrency {report['concurrency']}) in {report['elapsed_s']:.1f}s")
+    print(f"Throughput: {report['throughput_sessions_per_s']:.2f} sessions/s")
+    print(f"{'Latency (s)':<14}{'p50':>9}{'p99':>9}{'max':>9}")
+    for phase, stats in report["latency_s"].items():
+        print(f"  {phase:<12}{stats['p50']:>9.3f}{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+    print(f"Rows per session: {report['mean_rows_per_session']:.0f}")
+    for stub, count in report["stub_requests"].items():
+        print(f"Stub {stub}: {count} requests, {report['stub_errors'][stub]} injected errors")
+    memory = report["memory_mb"]
+    print(f"Memory: {memory['peak_allocations_per_session']:.1f} MB peak allocations per isolated session, "
+          f"RSS +{memory['rss_growth_under_load']:.1f} MB under load "
+          f"({memory['rss_growth_per_concurrent_session']:.1f} MB per concurrent session)")
+    if report["circuits"]:
+        print("Circuits: " + ", ".join(f"{host} {state}" for host, state in report["circuits"].items()))
+    for failure in report["failure_samples"]:
+        print(f"  failed: {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="total simulated sessions")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions running at the same time")
+    parser.add_argument("--country", choices=["US", "China"], default="US")
+    parser.add_argument("--tickers", nargs="+", default=DEFAULT_TICKERS)
+    parser.add_argument("--latency", type=float, default=100, help="mean stub response time in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--upstream-rate", type=float, default=None,
+                        help="per-host rate limit (requests/s) for the stubs instead of the production "
+                             "limits; 0 disables rate limiting")
+    parser.add_argument("--recordings", default=RECORDINGS_DIR, help="directory of recorded responses")
+    parser.add_argument("--record", action="store_true", help="record real responses into --recordings and exit")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    if args.record:
+        streamlit_data = import_apps()[0]
+        record(args.recordings, streamlit_data.get_urls(args.country), args.tickers)
+        return 0
+
+    report = run_load(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
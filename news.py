@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit
+
+import http_guard
+
+NEWS_TTL = 300  # seconds a ticker's headlines are served from cache
+FAILURE_TTL = 60  # seconds before a ticker whose fetch failed is tried again
+MAX_ITEMS = 2000  # stories kept in the in-memory index
+
+RSS_URL = "https://feeds.finance.yahoo.com/rss/2.0/headline?s={ticker}&region=US&lang=en-US"
+HTML_URL = "https://finance.yahoo.com/quote/{ticker}/news/"
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="news")
+_lock = threading.Lock()
+_fetched_at = {}  # ticker -> time of last successful fetch
+_failed_at = {}  # ticker -> time of last failed fetch
+_ticker_items = {}  # ticker -> set of story ids
+_inflight = {}  # ticker -> Future, so concurrent sessions share one request
+_items = {}  # story id -> story dict
+_title_ids = {}  # normalized title -> story id
+
+
+def normalize_url(link):
+    parts = urlsplit(link)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+
+def normalize_title(title):
+    return re.sub(r'\W+', ' ', title).strip().lower()
+
+
+def story_id(link):
+    return hashlib.sha1(normalize_url(link).encode('utf-8')).hexdigest()
+
+
+def parse_rss(content):
+    import xml.etree.ElementTree as ET
+
+    news = []
+    for item in ET.fromstring(content).iter('item'):
+        title = (item.findtext('title') or '').strip()
+        link = (item.findtext('link') or '').strip()
+        if not title or not link:
+            continue
+        try:
+            published = parsedate_to_datetime(item.findtext('pubDate'))
+            if published.tzinfo is None:
+                published = published.replace(tzinfo=timezone.utc)
+        except (TypeError, ValueError):
+            published = None
+        news.append({"title": title, "link": link, "published": published})
+    return news
+
+
+def parse_html(content):
+    # Fallback when the feed is unavailable: any headline that links to an article
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    news = []
+    for heading in soup.find_all('h3'):
+        link_element = heading.find_parent('a', href=True) or heading.find('a', href=True)
+        if link_element is None:
+            continue
+        link = link_element['href']
+        if link.startswith('/'):
+            link = f"https://finance.yahoo.com{link}"
+        news.append({"title": heading.get_text(strip=True), "link": link, "published": None})
+    return news
+
+
+def fetch_ticker_news(ticker):
+    try:
+        response = http_guard.get(RSS_URL.format(ticker=ticker), headers=HEADERS)
+        response.raise_for_status()
+        news = parse_rss(response.content)
+        if news:
+            return news
+    except Exception as e:
+        logging.warning(f"Error fetching news feed for {ticker}: {str(e)}")
+
+    response = http_guard.get(HTML_URL.format(ticker=ticker), headers=HEADERS)
+    response.raise_for_status()
+    return parse_html(response.text)
+
+
+def _store(ticker, news):
+    """Add fetched stories to the index, merging stories shared across tickers"""
+    ids = set()
+    with _lock:
+        for story in news:
+            title_key = normalize_title(story["title"])
+            sid = _title_ids.get(title_key) or story_id(story["link"])
+            existing = _items.get(sid)
+            if existing is None:
+                existing = dict(story, id=sid, tickers=set())
+                _items[sid] = existing
+                _title_ids[title_key] = sid
+            existing["tickers"].add(ticker)
+            if existing["published"] is None:
+                existing["published"] = story["published"]
+            ids.add(sid)
+        _ticker_items[ticker] = ids
+        _fetched_at[ticker] = time.monotonic()
+        _failed_at.pop(ticker, None)
+        _prune()
+
+
+def _prune():
+    if len(_items) <= MAX_ITEMS:
+        return
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    ordered = sorted(_items.values(), key=lambda s: s["published"] or oldest)
+    for story in ordered[:len(_items) - MAX_ITEMS]:
+        del _items[story["id"]]
+        _title_ids.pop(normalize_title(story["title"]), None)
+        for ids in _ticker_items.values():
+            ids.discard(story["id"])
+
+
+def _refresh(ticker):
+    try:
+        _store(ticker, fetch_ticker_news(ticker))
+    except Exception as e:
+        logging.error(f"Error fetching news for {ticker}: {str(e)}")
+        # Reruns inside FAILURE_TTL serve what is cached (possibly nothing) instead of refetching
+        with _lock:
+            _failed_at[ticker] = time.monotonic()
+    finally:
+        with _lock:
+            _inflight.pop(ticker, None)
+
+
+def refresh_news(tickers, force=False):
+    """Fetch every stale ticker in one parallel round and wait for it"""
+    now = time.monotonic()
+    futures = []
+    with _lock:
+        for ticker in dict.fromkeys(tickers):
+            fetched_at = _fetched_at.get(ticker)
+            if not force and fetched_at is not None and now - fetched_at < NEWS_TTL:
+                continue
+            failed_at = _failed_at.get(ticker)
+            if not force and failed_at is not None and now - failed_at < FAILURE_TTL:
+                continue
+            if ticker not in _inflight:
+                _inflight[ticker] = _executor.submit(_refresh, ticker)
+            futures.append(_inflight[ticker])
+    for future in futures:
+        future.result()
+
+
+def get_news(tickers, limit=10, force=False):
+    """Latest `limit` unique stories across tickers, newest first"""
+    refresh_news(tickers, force=force)
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    with _lock:
+        ids = set().union(*(_ticker_items.get(ticker, set()) for ticker in tickers))
+        stories = [dict(_items[sid], tickers=sorted(_items[sid]["tickers"])) for sid in ids if sid in _items]
+    stories.sort(key=lambda s: s["published"] or oldest, reverse=True)
+    return stories[:limit]
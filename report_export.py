@@ -0,0 +1,136 @@
+import atexit
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# Number of warm kaleido renderers kept alive for the whole server process
+REPORT_WORKERS = min(4, os.cpu_count() or 1)
+RENDER_TIMEOUT = 120  # seconds per figure
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _warm_renderer():
+    """Start kaleido once per worker so later renders skip the browser startup"""
+    try:
+        import plotly.io as pio
+        pio.to_image({"data": [], "layout": {}}, format="png", width=10, height=10)
+    except Exception as e:
+        logging.error(f"Error warming up image renderer: {str(e)}")
+
+
+def _render(fig_json, fmt, width, height, scale):
+    import plotly.io as pio
+    fig = pio.from_json(fig_json)
+    return pio.to_image(fig, format=fmt, width=width, height=height, scale=scale)
+
+
+def _new_executor():
+    # Spawn instead of fork: the Streamlit server is multi-threaded
+    return ProcessPoolExecutor(
+        max_workers=REPORT_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_renderer,
+    )
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _new_executor()
+        return _executor
+
+
+def recycle_executor(executor):
+    """Swap in a fresh pool for executor; renders other sessions queued on it still finish"""
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return  # another session already replaced it
+        _executor = _new_executor()
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False)
+    # A hung renderer never exits on its own, stop what is left once the others had time to finish
+    threading.Thread(target=_stop_processes, args=(processes,), daemon=True).start()
+
+
+def _stop_processes(processes):
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    for process in processes:
+        process.join(max(0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.terminate()
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown_executor)
+
+
+def render_figures(figs, fmt="png", width=None, height=None, scale=1):
+    """Render plotly figures to image bytes in parallel, keeping the input order"""
+    executor = get_executor()
+    futures = []
+    try:
+        futures = [executor.submit(_render, fig.to_json(), fmt, width, height, scale) for fig in figs]
+        return [future.result(timeout=RENDER_TIMEOUT) for future in futures]
+    except (BrokenProcessPool, FuturesTimeoutError):
+        # A renderer died or hung; drop this call's queued figures so later calls use fresh workers
+        for future in futures:
+            future.cancel()
+        recycle_executor(executor)
+        raise
+
+
+def render_figure(fig, fmt="png", width=None, height=None, scale=1):
+    return render_figures([fig], fmt=fmt, width=width, height=height, scale=scale)[0]
+
+
+def build_pdf(figs, scale=2):
+    """Combine figures into one multi-page PDF, one figure per page"""
+    from PIL import Image
+
+    pages = [Image.open(io.BytesIO(png)).convert("RGB") for png in render_figures(figs, "png", scale=scale)]
+    if not pages:
+        return b""
+    buffer = io.BytesIO()
+    pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:], resolution=72 * scale)
+    return buffer.getvalue()
+
+
+def safe_filename(name):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or "chart"
+
+
+def build_png_pack(named_figs, scale=2):
+    """Zip one PNG per figure, named after its key"""
+    names = list(named_figs.keys())
+    pngs = render_figures(list(named_figs.values()), "png", scale=scale)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i, (name, png) in enumerate(zip(names, pngs)):
+            archive.writestr(f"{i + 1:02d}_{safe_filename(name)}.png", png)
+    return buffer.getvalue()
+
+
+def build_report(named_figs, report_format="PDF"):
+    """Return (bytes, mime, extension) for a report of all figures"""
+    if report_format == "PDF":
+        return build_pdf(list(named_figs.values())), "application/pdf", "pdf"
+    return build_png_pack(named_figs), "application/zip", "zip"
@@ -0,0 +1,167 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import http_guard
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"))
+BATCH_SIZE = 50
+MAX_WORKERS = 8
+
+# Display name -> yfinance info key. Values are stored raw and only formatted for display.
+FIELDS = {
+    "Market Cap": "marketCap",
+    "Historical P/E": "trailingPE",
+    "Forward P/E": "forwardPE",
+    "PEG Ratio (5yr expected)": "pegRatio",
+    "Historical Dividend(%)": "trailingAnnualDividendYield",
+    "Price/Book": "priceToBook",
+    "Net Income": "netIncomeToCommon",
+    "Revenue": "totalRevenue",
+    "Profit Margin": "profitMargins",
+    "ROE": "returnOnEquity",
+}
+LARGE_NUMBER_FIELDS = ["Market Cap", "Net Income", "Revenue"]
+# Stored as Yahoo's fractions (0.035), displayed and entered as percentages
+PERCENT_FIELDS = ["Historical Dividend(%)", "Profit Margin", "ROE"]
+
+# Default universe: common HK ELI underlyings, edit to match the current issuer list
+HK_ELI_UNDERLYINGS = [
+    "0005.HK", "0027.HK", "0175.HK", "0388.HK", "0700.HK", "0883.HK", "0939.HK", "0941.HK",
+    "0981.HK", "1024.HK", "1211.HK", "1299.HK", "1398.HK", "1810.HK", "1928.HK", "2015.HK",
+    "2020.HK", "2318.HK", "3690.HK", "9618.HK", "9868.HK", "9888.HK", "9988.HK", "9999.HK",
+]
+
+_lock = threading.Lock()
+_loaded = {}  # snapshot path -> (mtime, DataFrame)
+
+
+def to_number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def fetch_fundamentals(ticker):
+    """Raw numeric fundamentals for one ticker; missing values are None"""
+    import yfinance as yf
+
+    info = http_guard.call("finance.yahoo.com", lambda: yf.Ticker(ticker).info, cache_key=("info", ticker))
+    return {name: to_number(info.get(key)) for name, key in FIELDS.items()}
+
+
+def fetch_universe(tickers, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS):
+    """Fetch fundamentals for all tickers in parallel batches, one row per ticker"""
+    def fetch(ticker):
+        try:
+            return dict(fetch_fundamentals(ticker), Ticker=ticker)
+        except Exception as e:
+            logging.error(f"Error fetching fundamentals for {ticker}: {str(e)}")
+            return None
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(tickers), batch_size):
+            rows.extend(row for row in executor.map(fetch, tickers[start:start + batch_size]) if row)
+    df = pd.DataFrame(rows, columns=["Ticker"] + list(FIELDS))
+    df[list(FIELDS)] = df[list(FIELDS)].astype("float64")
+    return df
+
+
+def snapshot_path(date=None):
+    date = date or datetime.now().date()
+    return os.path.join(SNAPSHOT_DIR, f"fundamentals_{date:%Y-%m-%d}.parquet")
+
+
+def load_snapshot(date=None):
+    """Return the day's snapshot (cached in memory), or None if it was never built"""
+    path = snapshot_path(date)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    df = pd.read_parquet(path)
+    with _lock:
+        _loaded[path] = (mtime, df)
+    return df
+
+
+def update_snapshot(tickers, force=False):
+    """Add missing tickers (or all with force) to today's snapshot and save it"""
+    tickers = list(dict.fromkeys(tickers))
+    current = load_snapshot()
+    if current is not None and not force:
+        missing = [t for t in tickers if t not in set(current["Ticker"])]
+    else:
+        missing = tickers
+
+    if not missing:
+        return current
+
+    fetched = fetch_universe(missing)
+    if current is not None and not force:
+        fetched = pd.concat([current, fetched], ignore_index=True)
+    df = fetched.drop_duplicates("Ticker", keep="last").sort_values("Ticker").reset_index(drop=True)
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path()
+    # Sessions are threads of one process, so the temp name must be unique per call
+    fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return load_snapshot()
+
+
+def screen(df, tickers=None, filters=None, sort_by=None, ascending=True):
+    """Filter a snapshot on {column: (min, max)} ranges (None = open) and sort it"""
+    mask = pd.Series(True, index=df.index)
+    if tickers is not None:
+        mask &= df["Ticker"].isin(tickers)
+    for column, (low, high) in (filters or {}).items():
+        if low is not None:
+            mask &= df[column] >= low
+        if high is not None:
+            mask &= df[column] <= high
+    result = df[mask]
+    if sort_by:
+        result = result.sort_values(sort_by, ascending=ascending, na_position="last")
+    return result
+
+
+def format_large_number(value):
+    if value is None or pd.isna(value):
+        return "N/A"
+    if abs(value) >= 1e12:
+        return f"{value/1e12:.2f}T"
+    elif abs(value) >= 1e9:
+        return f"{value/1e9:.2f}B"
+    elif abs(value) >= 1e6:
+        return f"{value/1e6:.2f}M"
+    return f"{value:.2f}"
+
+
+def format_value(name, value):
+    """Display string for one raw metric"""
+    if value is None or pd.isna(value):
+        return "N/A"
+    if name in LARGE_NUMBER_FIELDS:
+        return format_large_number(value)
+    if name in PERCENT_FIELDS:
+        return f"{value:.2%}"
+    return f"{value:.2f}"
+
+
+def formatters():
+    """Per-column formatters for pandas Styler, so the table still sorts numerically"""
+    return {name: (lambda value, name=name: format_value(name, value)) for name in FIELDS}
@@ -1,24 +1,39 @@
 import streamlit as st
-import yfinance as yf
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import pandas as pd
-import numpy as np
-import requests
-from bs4 import BeautifulSoup
-import plotly.io as pio
-import os
-from yahoofinancials import YahooFinancials  # Add this line
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import http_guard
+import news
+import report_export
+import screener
+
+# yfinance, yahoofinancials and plotly are imported inside the
+# functions that use them to keep app start and worker spawn fast
 
 # Set page to wide mode
 st.set_page_config(layout="wide")
 
 def get_stock_data(ticker, period="1y"):
+    import yfinance as yf
+
     stock = yf.Ticker(ticker)
-    data = stock.history(period=period)
+    data = http_guard.call("finance.yahoo.com", stock.history, period=period, cache_key=("history", ticker, period))
     data = data.dropna()
     return data
 
+def fetch_watchlist_data(tickers, period="1y"):
+    # Fetch price history for all tickers concurrently; failed tickers map to None
+    def fetch(ticker):
+        try:
+            return get_stock_data(ticker, period)
+        except Exception as e:
+            logging.error(f"Error fetching data for {ticker}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(8, len(tickers) or 1)) as executor:
+        return dict(zip(tickers, executor.map(fetch, tickers)))
+
 def format_ticker(ticker):
     if ticker.isdigit():
         return f"{int(ticker):04d}.HK"
@@ -60,6 +75,8 @@ def calculate_volume_profile(data, bins=40):
     return volume_profile, bin_centers, bin_size, poc_price, value_area_low, value_area_high
 
 def plot_stock_chart(data, ticker, strike_price, airbag_price, knockout_price):
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     # Candlestick chart with custom colors
@@ -188,76 +205,59 @@ def plot_stock_chart(data, ticker, strike_price, airbag_price, knockout_price):
     return fig
 
 def get_financial_metrics(ticker):
-    stock = yf.Ticker(ticker)
-    info = stock.info
-    
-    metrics = {
-        "Market Cap": info.get("marketCap", "N/A"),       
-        "Historical P/E": info.get("trailingPE", "N/A"),
-        "Forward P/E": info.get("forwardPE", "N/A"),
-        "PEG Ratio (5yr expected)": info.get("pegRatio", "N/A"),
-        "Historical Dividend(%)": info.get("trailingAnnualDividendYield", "N/A")*100,
-        "Price/Book": info.get("priceToBook", "N/A"),
-        "Net Income": info.get("netIncomeToCommon", "N/A"),
-        "Revenue": info.get("totalRevenue", "N/A"),  # Changed from "revenue" to "totalRevenue"
-        "Profit Margin": info.get("profitMargins", "N/A"),  # Changed from "profitMargin" to "profitMargins"
-        "ROE": info.get("returnOnEquity", "N/A"),
-    }
-    
-    # Format large numbers
-    for key in ["Market Cap", "Net Income", "Revenue"]:
-        if isinstance(metrics[key], (int, float)):
-            if abs(metrics[key]) >= 1e12:
-                metrics[key] = f"{metrics[key]/1e12:.2f}T"
-            elif abs(metrics[key]) >= 1e9:
-                metrics[key] = f"{metrics[key]/1e9:.2f}B"
-            elif abs(metrics[key]) >= 1e6:
-                metrics[key] = f"{metrics[key]/1e6:.2f}M"
-    
-    # Format percentages
-    for key in ["Profit Margin", "ROE"]:
-        if isinstance(metrics[key], float):
-            metrics[key] = f"{metrics[key]:.2%}"
-    
-    # Round floating point numbers
-    for key, value in metrics.items():
-        if isinstance(value, float):
-            metrics[key] = round(value, 2)
-    
-    return metrics
+    # Raw values come from screener.py, formatting only happens here for display
+    values = screener.fetch_fundamentals(ticker)
+    return {name: screener.format_value(name, value) for name, value in values.items()}
 
-def get_yahoo_finance_news(ticker):
-    url = f"https://finance.yahoo.com/quote/{ticker}/news/"
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-    
+def show_screener():
+    with st.expander("Fundamentals Screener"):
+        universe = st.text_area("Universe (comma separated tickers):", value=", ".join(screener.HK_ELI_UNDERLYINGS))
+        tickers = list(dict.fromkeys(format_ticker(t.strip()) for t in universe.split(",") if t.strip()))
+
+        if st.button("Update Today's Snapshot"):
+            with st.spinner(f"Fetching fundamentals for {len(tickers)} tickers..."):
+                try:
+                    screener.update_snapshot(tickers)
+                except Exception as e:
+                    st.error(f"Error updating snapshot: {str(e)}")
+
+        snapshot = screener.load_snapshot()
+        if snapshot is None:
+            st.info("No snapshot for today yet. Click 'Update Today's Snapshot' to build it.")
+            return
+
+        filters = {}
+        cols = st.columns(4)
+        for col, name in zip(cols, ["Forward P/E", "PEG Ratio (5yr expected)", "Historical Dividend(%)", "ROE"]):
+            # Ratios stored as fractions are entered as percentages, like they are displayed
+            scale = 100 if name in screener.PERCENT_FIELDS else 1
+            label = f"{name} (%)" if scale == 100 and not name.endswith("(%)") else name
+            low = col.number_input(f"Min {label}", value=None, key=f"min_{name}")
+            high = col.number_input(f"Max {label}", value=None, key=f"max_{name}")
+            filters[name] = (None if low is None else low / scale, None if high is None else high / scale)
+
+        sort_col, order_col = st.columns([3, 1])
+        sort_by = sort_col.selectbox("Sort by", list(screener.FIELDS), index=list(screener.FIELDS).index("Forward P/E"))
+        ascending = order_col.radio("Order", ["Ascending", "Descending"]) == "Ascending"
+
+        result = screener.screen(snapshot, tickers=tickers, filters=filters, sort_by=sort_by, ascending=ascending)
+        st.write(f"{len(result)} of {len(snapshot)} tickers match")
+        st.dataframe(result.style.format(screener.formatters()), use_container_width=True)
+
+def get_yahoo_finance_news(tickers, limit=5):
+    # Cached and deduplicated across tickers, see news.py
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        news_items = soup.find_all('li', class_='js-stream-content Pos(r)')
-        
-        news = []
-        for item in news_items[:5]:  # Get top 5 news items
-            title_element = item.find('h3')
-            link_element = item.find('a', href=True)
-            
-            if title_element and link_element:
-                title = title_element.text.strip()
-                link = link_element['href']
-                # Ensure the link is absolute
-                if link.startswith('/'):
-                    link = f"https://finance.yahoo.com{link}"
-                news.append((title, link))
-        
-        return news
+        return [(item['title'], item['link']) for item in news.get_news(tickers, limit=limit)]
     except Exception as e:
         st.error(f"Error fetching news: {str(e)}")
         return []
-    
+
 def get_analyst_ratings(ticker):
+    from yahoofinancials import YahooFinancials
+
     yahoo_financials = YahooFinancials(ticker)
-    analyst_data = yahoo_financials.get_stock_earnings_data()
+    analyst_data = http_guard.call("finance.yahoo.com", yahoo_financials.get_stock_earnings_data,
+                                   cache_key=("earnings", ticker))
     
     if analyst_data and ticker in analyst_data:
         earnings_data = analyst_data[ticker]
@@ -270,8 +270,11 @@ def get_analyst_ratings(ticker):
     return None
 
 def get_analyst_recommendations(ticker):
+    import yfinance as yf
+
     stock = yf.Ticker(ticker)
-    recommendations = stock.recommendations
+    recommendations = http_guard.call("finance.yahoo.com", lambda: stock.recommendations,
+                                      cache_key=("recommendations", ticker))
     if recommendations is not None and not recommendations.empty:
         recent_recommendations = recommendations.tail(10)  # Get last 10 recommendations
         upgrades = recent_recommendations[recent_recommendations['To Grade'] > recent_recommendations['From Grade']]
@@ -388,32 +391,57 @@ def main():
                 st.markdown(f"<p>50 EMA: {ema_50:.2f}</p>", unsafe_allow_html=True)
                 st.markdown(f"<p>200 EMA: {ema_200:.2f}</p>", unsafe_allow_html=True)
 
-                # Display news
+                # Display news for the ticker and the watchlist
                 st.markdown("<h3>Latest News:</h3>", unsafe_allow_html=True)
-                st.info(f"You can try visiting this URL directly for news: https://finance.yahoo.com/quote/{st.session_state.formatted_ticker}/news/")
+                watchlist = st.text_input("Watchlist tickers (comma separated):", value=ticker)
+                watchlist_tickers = list(dict.fromkeys(format_ticker(t.strip()) for t in watchlist.split(",") if t.strip()))
+                news_tickers = list(dict.fromkeys([st.session_state.formatted_ticker] + watchlist_tickers))
+                headlines = get_yahoo_finance_news(news_tickers, limit=10)
+                if headlines:
+                    for title, link in headlines:
+                        st.markdown(f"- [{title}]({link})")
+                else:
+                    st.info(f"You can try visiting this URL directly for news: https://finance.yahoo.com/quote/{st.session_state.formatted_ticker}/news/")
 
                 # Add screenshot button
                 if st.button("Take Screenshot"):
                     try:
-                        # Save the figure as a temporary file
-                        temp_file = f"{st.session_state.formatted_ticker}_chart.png"
-                        pio.write_image(fig, temp_file)
-                        
-                        # Read the file and create a download button
-                        with open(temp_file, "rb") as file:
-                            btn = st.download_button(
-                                label="Download Chart Screenshot",
-                                data=file,
-                                file_name=f"{st.session_state.formatted_ticker}_chart.png",
-                                mime="image/png"
-                            )
-                        
-                        # Remove the temporary file
-                        os.remove(temp_file)
-                        
+                        # Render in memory on the shared warm renderer, no temp files
+                        png = report_export.render_figure(fig)
+                        st.download_button(
+                            label="Download Chart Screenshot",
+                            data=png,
+                            file_name=f"{st.session_state.formatted_ticker}_chart.png",
+                            mime="image/png"
+                        )
                     except Exception as e:
                         st.error(f"Error generating screenshot: {str(e)}")
-                        st.error("If the error persists, please try updating plotly and kaleido: pip install -U plotly kaleido")
+                        st.error("If the error persists, reinstall the pinned plotly and kaleido versions: pip install -r requirements.txt")
+
+                # Watchlist report with one chart per ticker
+                st.markdown("<h3>Watchlist Report:</h3>", unsafe_allow_html=True)
+                report_format = st.radio("Report format:", ["PDF", "PNG pack"], horizontal=True)
+                if st.button("Build Watchlist Report"):
+                    with st.spinner("Building watchlist report..."):
+                        try:
+                            figs = {}
+                            for t, data in fetch_watchlist_data(watchlist_tickers).items():
+                                if data is None or data.empty:
+                                    st.warning(f"No data available for {t}")
+                                    continue
+                                levels = calculate_price_levels(data['Close'].iloc[-1], strike_pct, airbag_pct, knockout_pct)
+                                figs[t] = plot_stock_chart(data, t, *levels)
+
+                            if figs:
+                                content, mime, extension = report_export.build_report(figs, report_format)
+                                st.download_button(
+                                    label=f"Download Watchlist Report ({report_format})",
+                                    data=content,
+                                    file_name=f"watchlist_report.{extension}",
+                                    mime=mime
+                                )
+                        except Exception as e:
+                            st.error(f"Error generating watchlist report: {str(e)}")
 
         except Exception as e:
             st.error(f"Error processing data: {str(e)}")
@@ -424,5 +452,7 @@ def main():
     else:
         st.warning("No data available. Please check the ticker symbol and try again.")
 
+    show_screener()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,17 +1,27 @@
 import streamlit as st
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta 
 import re
 import logging
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import event_study
+import exports
+import http_guard
+import report_export
+
+# bs4 and plotly are imported inside the functions that use them
+# to keep app start and worker spawn fast
 
 logging.basicConfig(level=logging.INFO)
 
 st.set_page_config(page_title="US and China Economic Data Analysis (Jason Chan)", layout="wide")
 
+RAW_COLUMNS = ['Title', 'Date', 'Time', 'Actual', 'Forecast', 'Previous', 'Importance']
+SUMMARY_COLUMNS = ["Indicator", "Data Update", "Vs Forecast", "Forecast", "This Month", "1 Month Ago", "2 Months Ago", "3 Months Ago", "4 Months Ago"]
+SCRAPE_WORKERS = 8
+SCRAPE_TIMEOUT = 90  # seconds for a whole batch; pages still pending are marked as timed out
+
 def get_urls(country):
     if country == "US":
         return [
@@ -149,35 +159,69 @@ def is_future_month(date_str):
         return actual_date > current_date
     return False
 
-def scrape_data(urls):
+def scrape_page(url):
+    from bs4 import BeautifulSoup
+
     data = []
     current_date = datetime.now()
 
-    for url in urls:
-        try:
-            response = requests.get(url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            title = soup.title.string if soup.title else "No title"
-            rows = soup.find_all('tr')
-            row_counter = 0
-            
-            for row in rows:
-                if row_counter >= 6:
-                    break
-                cols = row.find_all('td')
-                if len(cols) == 6:
-                    date_str = safe_strip(cols[0].text)
-                    actual_date, reported_month = parse_date(date_str)
-                    if actual_date and actual_date <= current_date:
-                        cols_text = [safe_strip(col.text) for col in cols]
-                        if cols_text[3] == '':
-                            cols_text[3] = None
-                        data.append([title] + cols_text)
-                        row_counter += 1
-        except Exception as e:
-            logging.error(f"Error scraping {url}: {str(e)}")
+    # Rate limited per host; serves the last good page while investing.com is unhealthy
+    response = http_guard.get(url)
+    soup = BeautifulSoup(response.content, 'html.parser')
+    title = soup.title.string if soup.title else "No title"
+    rows = soup.find_all('tr')
+    row_counter = 0
     
-    return pd.DataFrame(data, columns=['Title', 'Date', 'Time', 'Actual', 'Forecast', 'Previous', 'Importance'])
+    for row in rows:
+        if row_counter >= 6:
+            break
+        cols = row.find_all('td')
+        if len(cols) == 6:
+            date_str = safe_strip(cols[0].text)
+            actual_date, reported_month = parse_date(date_str)
+            if actual_date and actual_date <= current_date:
+                cols_text = [safe_strip(col.text) for col in cols]
+                if cols_text[3] == '':
+                    cols_text[3] = None
+                data.append([title] + cols_text)
+                row_counter += 1
+
+    return data, response.from_cache
+
+def page_result(url, future):
+    try:
+        rows, from_cache = future.result()
+        return {"url": url, "rows": rows, "status": "Cached" if from_cache else "ok"}
+    except http_guard.HostUnavailableError as e:
+        logging.warning(f"Skipped {url}: {str(e)}")
+        return {"url": url, "rows": [], "status": "Unavailable"}
+    except Exception as e:
+        logging.error(f"Error scraping {url}: {str(e)}")
+        return {"url": url, "rows": [], "status": "Failed"}
+
+def iter_scrape(urls, timeout=SCRAPE_TIMEOUT):
+    """Yield {"url", "rows", "status"} for each page as soon as it is parsed"""
+    executor = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS)
+    futures = {executor.submit(scrape_page, url): url for url in urls}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            pending.discard(future)
+            yield page_result(futures[future], future)
+    except FuturesTimeoutError:
+        for future in pending:
+            if future.done():
+                yield page_result(futures[future], future)
+            else:
+                logging.warning(f"Timed out scraping {futures[future]}")
+                yield {"url": futures[future], "rows": [], "status": "Timed out"}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def scrape_data(urls):
+    pages = {page['url']: page['rows'] for page in iter_scrape(urls)}
+    data = [row for url in urls for row in pages.get(url, [])]
+    return pd.DataFrame(data, columns=RAW_COLUMNS)
 
 def parse_date(date_str):
     patterns = [
@@ -221,10 +265,7 @@ def compare_values(actual, forecast, indicator, lower_is_better):
     else:
         return "Better" if actual_value > forecast_value else "Worse" if actual_value < forecast_value else "Same"
 
-def process_data(df, country):
-    indicators = get_indicators(country)
-    lower_is_better = get_lower_is_better(country)
-
+def collect_indicator_data(df, indicators, lower_is_better):
     for _, row in df.iterrows():
         indicator = row['Title'].split(' - ')[0]
         if indicator in indicators:
@@ -250,32 +291,95 @@ def process_data(df, country):
                 "Actual": actual if actual and actual != '-' else None
             })
 
+def summarize_indicator(indicator, data):
+    sorted_data = sorted(data, key=lambda x: x['Date'], reverse=True)
+    latest = sorted_data[0]
+    row = [
+        indicator,
+        latest['Date'].strftime("%b %d, %Y") + f" ({latest['MonthInParentheses']})",
+        latest['Vs Forecast'] if latest['Actual'] is not None else '',
+        latest['Forecast'] if latest['Forecast'] else 'None'
+    ]
+    actuals = []
+    for i in range(5):
+        if i < len(sorted_data):
+            actuals.append(sorted_data[i].get('Actual') or 'None')
+        else:
+            actuals.append('None')
+    row.extend(actuals)
+    return row
+
+def summary_table(indicators, status, placeholders=True):
+    # One row per indicator in the usual order, pending or failed ones show their status
+    # unless placeholders is False; rows served from the cache are marked as such
+    rows = []
+    for indicator, data in indicators.items():
+        if data:
+            row = summarize_indicator(indicator, data)
+            if status.get(indicator) == "Cached":
+                row[1] += " (cached)"
+            rows.append(row)
+        elif placeholders:
+            rows.append([indicator, status.get(indicator, "Loading..."), '', ''] + [''] * 5)
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+def process_data(df, country):
+    indicators = get_indicators(country)
+    lower_is_better = get_lower_is_better(country)
+    collect_indicator_data(df, indicators, lower_is_better)
+
     processed_data = []
     for indicator, data in indicators.items():
         if data:
-            sorted_data = sorted(data, key=lambda x: x['Date'], reverse=True)
-            latest = sorted_data[0]
-            row = [
-                indicator,
-                latest['Date'].strftime("%b %d, %Y") + f" ({latest['MonthInParentheses']})",
-                latest['Vs Forecast'] if latest['Actual'] is not None else '',
-                latest['Forecast'] if latest['Forecast'] else 'None'
-            ]
-            actuals = []
-            for i in range(5):
-                if i < len(sorted_data):
-                    actuals.append(sorted_data[i].get('Actual') or 'None')
-                else:
-                    actuals.append('None')
-            row.extend(actuals)
-            processed_data.append(row)
+            processed_data.append(summarize_indicator(indicator, data))
         else:
             logging.warning(f"No data for indicator: {indicator}")
 
     return processed_data, indicators
 
 
+def style_summary(df, country):
+    def color_rows(row):
+        if country == "US":
+            if row.name < 5:  # Employment data
+                return ['background-color: #FFFFE0; text-align: center; vertical-align: middle'] * len(row)
+            elif 5 <= row.name < 13:  # Inflation data
+                return ['background-color: #E6E6FA; text-align: center; vertical-align: middle'] * len(row)
+            else:  # Other economic indicators
+                return ['background-color: #E6F3FF; text-align: center; vertical-align: middle'] * len(row)
+        elif country == "China":
+            if row.name < 6:  # First 6 indicators
+                return ['background-color: #FFFFE0; text-align: center; vertical-align: middle'] * len(row)
+            elif 6 <= row.name < 9:  # Indicators 7-9
+                return ['background-color: #E6E6FA; text-align: center; vertical-align: middle'] * len(row)
+            elif 9 <= row.name < 14:  # Indicators 10-14
+                return ['background-color: #E6F3FF; text-align: center; vertical-align: middle'] * len(row)
+            else:  # Indicators 15-18
+                return ['background-color: #FFFFFF; text-align: center; vertical-align: middle'] * len(row)
+    
+    def color_text(val):
+        if val == 'Worse':
+            return 'color: red'
+        elif val == 'Better':
+            return 'color: green'
+        elif val in ('Loading...', 'Failed', 'Unavailable', 'Timed out', 'No data') or str(val).endswith('(cached)'):
+            return 'color: gray; font-style: italic'
+        return ''
+
+    styled_df = df.style.apply(color_rows, axis=1)
+    styled_df = styled_df.applymap(color_text, subset=['Vs Forecast', 'Data Update'])
+    styled_df = styled_df.set_properties(**{
+        'text-align': 'center',
+        'vertical-align': 'middle',
+        'height': '50px'  # Adjust cell height
+    })
+    return styled_df
+
+
 def create_chart(data, indicator):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
     dates = [d['Date'] for d in data]
     actuals = [float(safe_strip(d['Actual']).rstrip('K%M')) if d['Actual'] and d['Actual'] not in ['', 'None'] else None for d in data]
     forecasts = [float(safe_strip(d['Forecast']).rstrip('K%M')) if d['Forecast'] and d['Forecast'] not in ['', 'None'] else None for d in data]
@@ -316,6 +420,59 @@ def create_chart(data, indicator):
 
     return fig
 
+def export_controls(label, key, build_frame, file_stem):
+    # The file is only built when the download button is clicked, not on every rerun.
+    # Streamlit calls build_frame in a worker thread without session state, so it must
+    # only use values captured during the script run.
+    col1, col2 = st.columns([1, 3])
+    fmt = col1.selectbox(f"{label} export format", list(exports.FORMATS), key=f"{key}_format")
+    extension, mime = exports.FORMATS[fmt]
+    col2.download_button(
+        label=f"Download {label.lower()} as {fmt}",
+        data=lambda: exports.export_file(build_frame(), fmt),
+        file_name=f"{file_stem}.{extension}",
+        mime=mime,
+        key=f"{key}_download",
+        on_click="ignore",
+    )
+
+def show_event_study(raw_df, indicator_names):
+    with st.expander("Market Reaction to Releases (Event Study)"):
+        tickers_text = st.text_input("Tickers (comma separated)", value="^HSI, 0700.HK, 9988.HK, ^GSPC")
+        tickers = list(dict.fromkeys(t.strip() for t in tickers_text.split(",") if t.strip()))
+        selected = st.multiselect("Indicators", indicator_names, default=indicator_names[:3])
+        st.caption(f"Release times are read as {event_study.RELEASE_TZ}. Day 0 is each ticker's first session "
+                   "closing after the release, so a US release after the Hong Kong close lands on the next HK session.")
+
+        if st.button("Run event study"):
+            with st.spinner("Aligning releases with price history..."):
+                try:
+                    st.session_state.event_study = event_study.run_event_study(raw_df, tickers, selected)
+                except Exception as e:
+                    st.error(f"Error running event study: {str(e)}")
+                    logging.exception("Error running event study")
+
+        if st.session_state.get('event_study') is None:
+            return
+        reactions, summary = st.session_state.event_study
+        if summary.empty:
+            st.warning("No releases with both actual and forecast values overlap the price history.")
+            return
+
+        window = st.selectbox("Window", list(event_study.WINDOWS))
+        st.dataframe(summary[summary['Window'] == window], use_container_width=True)
+
+        import plotly.graph_objects as go
+
+        fig = go.Figure()
+        window_reactions = reactions[reactions['Window'] == window]
+        for (indicator, ticker), group in window_reactions.groupby(['Indicator', 'Ticker']):
+            fig.add_trace(go.Scatter(x=group['Surprise'], y=group['Return'], mode="markers", name=f"{ticker} / {indicator}",
+                                     text=group['Release Date'].dt.strftime("%b %d, %Y")))
+        fig.update_layout(title=f"Return vs Surprise ({window})", xaxis_title="Surprise (Actual - Forecast)",
+                          yaxis_title="Return", yaxis_tickformat=".1%", height=500)
+        st.plotly_chart(fig, use_container_width=True)
+
 def main():
     st.title("US and China Economic Data Analysis (Jason Chan)")
 
@@ -332,30 +489,51 @@ def main():
         st.session_state.raw_df = None
 
     if st.button("Scrape and analyze data"):
-        with st.spinner("Scraping and analyzing data... This may take a few minutes."):
-            try:
-                urls = get_urls(country)
-                df = scrape_data(urls)
-                
-                if not df.empty:
-                    st.success("Data scraped successfully!")
-                    
-                    # Save raw data
-                    st.session_state.raw_df = df
-                    
-                    processed_data, indicators = process_data(df, country)
-                    
-                    if processed_data:
-                        st.success("Data analyzed successfully!")
-                        st.session_state.processed_df = pd.DataFrame(processed_data, columns=["Indicator", "Data Update", "Vs Forecast", "Forecast", "This Month", "1 Month Ago", "2 Months Ago", "3 Months Ago", "4 Months Ago"])
-                        st.session_state.indicators = indicators
-                    else:
-                        st.warning("No data processed. Please check the data structure.")
-                else:
-                    st.warning("No data scraped. Please check the URLs and try again.")
-            except Exception as e:
-                st.error(f"An error occurred during processing: {str(e)}")
-                logging.exception("An error occurred during processing")
+        try:
+            urls = get_urls(country)
+            indicators = get_indicators(country)
+            lower_is_better = get_lower_is_better(country)
+            url_indicators = dict(zip(urls, indicators))
+            status = {}
+            raw_rows = []
+
+            # Show each indicator as soon as its page is parsed
+            progress = st.progress(0.0, text="Scraping and analyzing data...")
+            table_placeholder = st.empty()
+            sidebar_placeholder = st.sidebar.empty()
+            for i, page in enumerate(iter_scrape(urls), start=1):
+                raw_rows.extend(page['rows'])
+                collect_indicator_data(pd.DataFrame(page['rows'], columns=RAW_COLUMNS), indicators, lower_is_better)
+                indicator = url_indicators.get(page['url'])
+                if indicator and page['status'] == "Cached":
+                    status[indicator] = "Cached"
+                elif indicator and not indicators.get(indicator):
+                    status[indicator] = page['status'] if page['status'] != "ok" else "No data"
+
+                table_placeholder.dataframe(style_summary(summary_table(indicators, status), country))
+                sidebar_placeholder.markdown("\n".join(f"- {name}" for name, data in indicators.items() if data))
+                progress.progress(i / len(urls), text=f"Loaded {i} of {len(urls)} indicators")
+            progress.empty()
+            table_placeholder.empty()
+            sidebar_placeholder.empty()
+
+            for host, state in http_guard.host_status().items():
+                if state != "closed":
+                    st.warning(f"{host} is currently unavailable; showing the last good data where available.")
+
+            if raw_rows:
+                st.success("Data scraped and analyzed successfully!")
+                st.session_state.raw_df = pd.DataFrame(raw_rows, columns=RAW_COLUMNS)
+                # Pending and failed rows only belong in the progressive table, failures are listed below
+                st.session_state.processed_df = summary_table(indicators, status, placeholders=False)
+                st.session_state.indicators = indicators
+                if status:
+                    st.warning("Could not load: " + ", ".join(f"{name} ({reason})" for name, reason in status.items()))
+            else:
+                st.warning("No data scraped. Please check the URLs and try again.")
+        except Exception as e:
+            st.error(f"An error occurred during processing: {str(e)}")
+            logging.exception("An error occurred during processing")
 
     if st.session_state.raw_df is not None:
         with st.expander("Click to view raw data"):
@@ -363,49 +541,14 @@ def main():
             st.dataframe(st.session_state.raw_df)
         
         # Add button to download raw data
-        csv_raw = st.session_state.raw_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Download raw data as CSV",
-            data=csv_raw,
-            file_name=f"raw_{country.lower()}_economic_data.csv",
-            mime="text/csv",
-        )
+        raw_df = st.session_state.raw_df
+        export_controls("Raw data", "raw", lambda: exports.typed_raw_data(raw_df),
+                        f"raw_{country.lower()}_economic_data")
 
     if st.session_state.processed_df is not None:
         st.subheader("Data Summary")
         
-        def color_rows(row):
-            if country == "US":
-                if row.name < 5:  # Employment data
-                    return ['background-color: #FFFFE0; text-align: center; vertical-align: middle'] * len(row)
-                elif 5 <= row.name < 13:  # Inflation data
-                    return ['background-color: #E6E6FA; text-align: center; vertical-align: middle'] * len(row)
-                else:  # Other economic indicators
-                    return ['background-color: #E6F3FF; text-align: center; vertical-align: middle'] * len(row)
-            elif country == "China":
-                if row.name < 6:  # First 6 indicators
-                    return ['background-color: #FFFFE0; text-align: center; vertical-align: middle'] * len(row)
-                elif 6 <= row.name < 9:  # Indicators 7-9
-                    return ['background-color: #E6E6FA; text-align: center; vertical-align: middle'] * len(row)
-                elif 9 <= row.name < 14:  # Indicators 10-14
-                    return ['background-color: #E6F3FF; text-align: center; vertical-align: middle'] * len(row)
-                else:  # Indicators 15-18
-                    return ['background-color: #FFFFFF; text-align: center; vertical-align: middle'] * len(row)
-        
-        def color_text(val):
-            if val == 'Worse':
-                return 'color: red'
-            elif val == 'Better':
-                return 'color: green'
-            return ''
-
-        styled_df = st.session_state.processed_df.style.apply(color_rows, axis=1)
-        styled_df = styled_df.applymap(color_text, subset=['Vs Forecast'])
-        styled_df = styled_df.set_properties(**{
-            'text-align': 'center',
-            'vertical-align': 'middle',
-            'height': '50px'  # Adjust cell height
-        })
+        styled_df = style_summary(st.session_state.processed_df, country)
         
         # Create two-column layout
         col1, col2 = st.columns([3, 2])
@@ -432,13 +575,37 @@ def main():
                 else:
                     chart_placeholder.warning(f"No valid data found for {row['Indicator']}")
         
-        csv = st.session_state.processed_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Download processed data as CSV",
-            data=csv,
-            file_name=f"processed_{country.lower()}_economic_data.csv",
-            mime="text/csv",
-        )
+        processed_df = st.session_state.processed_df
+        export_controls("Processed data", "processed", lambda: exports.typed_processed_data(processed_df),
+                        f"processed_{country.lower()}_economic_data")
+
+        # Export a report with the chart of every indicator
+        report_format = st.radio("Report format", ["PDF", "PNG pack"], horizontal=True)
+        if st.button("Build report for all indicators"):
+            with st.spinner("Rendering charts..."):
+                try:
+                    figs = {}
+                    for indicator in st.session_state.processed_df['Indicator']:
+                        indicator_data = st.session_state.indicators.get(indicator, [])
+                        indicator_data = [d for d in indicator_data if d.get('Actual')]
+                        if indicator_data:
+                            figs[indicator] = create_chart(indicator_data, indicator)
+
+                    if figs:
+                        content, mime, extension = report_export.build_report(figs, report_format)
+                        st.download_button(
+                            label=f"Download {country} report ({report_format})",
+                            data=content,
+                            file_name=f"{country.lower()}_economic_report.{extension}",
+                            mime=mime,
+                        )
+                    else:
+                        st.warning("No chart data available for the report.")
+                except Exception as e:
+                    st.error(f"Error generating report: {str(e)}")
+                    logging.exception("Error generating report")
+
+        show_event_study(st.session_state.raw_df, list(st.session_state.processed_df['Indicator']))
 
     st.warning("Note: This scraper and analyzer is for educational purposes only and does not guarantee data accuracy. Please respect the website's terms of service and robots.txt file. Data source: investing.com")
     st.warning("Note: Lower Inflation data is good in US as Inflation is the problem; Higher in China is good as Deflation is the problem")